@@ -1,16 +1,15 @@
 import streamlit as st
-import pandas as pd
 import os
 import tempfile
 import shutil
 import time
-import sys
-from io import StringIO
-from PIL import Image
 import main
 import base64
-from tqdm import tqdm
-from stqdm import stqdm
+from shared_cache import SharedCache
+
+# pandas et les dépendances du traitement (scikit-learn, Mistral, PIL) ne sont
+# importés que lorsqu'un rapprochement ou une recherche est lancé, afin que le
+# rendu de la page reste instantané à chaque ré-exécution du script.
 
 # Configuration
 st.set_page_config(page_title="Bank Reconciliation System", layout="wide")
@@ -50,6 +49,21 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_shared_cache():
+    """Cache unique pour toutes les sessions du serveur (relevés, index).
+
+    Le cache est facultatif : si son dossier est inutilisable, l'application
+    fonctionne sans cache.
+    """
+    try:
+        return SharedCache()
+    except OSError as e:
+        print(f"Cache partagé désactivé : {e}")
+        return None
+
+shared_cache = get_shared_cache()
+
 def safe_display_columns(df, columns):
     return df[[col for col in columns if col in df.columns]]
 
@@ -69,6 +83,20 @@ def image_to_base64(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode('utf-8')
 
+def show_cache_stats():
+    """Affiche les statistiques du cache partagé dans la barre latérale."""
+    if shared_cache is None:
+        return
+    with st.sidebar.expander("Cache partagé"):
+        for namespace, counters in shared_cache.stats().items():
+            if namespace == "_memory":
+                st.caption(f"Mémoire : {counters['bytes'] / 1e6:.1f} / {counters['max_bytes'] / 1e6:.0f} Mo "
+                           f"({counters['entries']} entrées)")
+            else:
+                st.caption(f"{namespace} : {counters['hit_rate']:.0%} de succès "
+                           f"({counters['hits'] + counters['disk_hits']}/"
+                           f"{counters['hits'] + counters['disk_hits'] + counters['misses']})")
+
 def display_image_from_base64(base64_str, caption):
     st.markdown(
         f'<img src="data:image/jpeg;base64,{base64_str}" width="350" style="border-radius: 10px; box-shadow: 0 4px 8px 0 rgba(0,0,0,0.2);"/>',
@@ -144,12 +172,13 @@ with tab1:
                     status_text.text(f"Traitement des données... Étape {i}/10")
                 
                 # Appel réel à votre fonction de traitement
-                main.process_uploads(receipts_dir, statements_dir, output_csv)
+                main.process_uploads(receipts_dir, statements_dir, output_csv, cache=shared_cache)
                 progress_bar.progress(85)
 
                 # Étape 5: Chargement résultats (15%)
                 status_text.text("Chargement des résultats...")
                 if os.path.exists(output_csv):
+                    import pandas as pd
                     st.session_state.results_df = pd.read_csv(output_csv)
                     st.session_state.clicked_row = None
                     progress_bar.progress(100)
@@ -266,6 +295,7 @@ with tab2:
                     
                     # Étape 5: Affichage des résultats (10%)
                     if matches:
+                        import pandas as pd
                         st.session_state.results_df = pd.DataFrame(matches)
                         st.session_state.clicked_row = None
                         progress_bar.progress(100)
@@ -319,3 +349,7 @@ with tab2:
                     st.json({k: selected[k] for k in items_keeped if k in selected})
             else:
                 st.warning("Image non disponible")
+
+# Statistiques du cache partagé, affichées après un éventuel traitement
+# pour refléter les succès et échecs de l'exécution en cours
+show_cache_stats()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from receipt_extraction import effective_batch_size, extract_receipts_batch
+
+# Estimation grossière du coût d'une requête côté serveur
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 1000
+
+class StubStats:
+    """Compteurs partagés entre les requêtes du serveur simulé."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+# Champs renvoyés à null par le serveur simulé (--null-fields)
+NULL_FIELDS = ()
+
+def fake_receipt(index):
+    """Génère une facture plausible pour le serveur simulé."""
+    receipt = {
+        "date": f"{random.randint(1, 12):02d}/{random.randint(1, 28):02d}/2024",
+        "time": "12:30",
+        "currency": "EUR",
+        "vendor": f"VENDOR {index}",
+        "amount": f"{random.uniform(1, 500):.2f}",
+        "adresse": "1 rue de la Paix, 75002 Paris"
+    }
+    receipt.update({field: None for field in NULL_FIELDS})
+    return receipt
+
+def make_handler(stats, base_latency, image_latency, drop_rate, server_max_images=None):
+    class StubHandler(BaseHTTPRequestHandler):
+        """Imite l'endpoint /v1/chat/completions de Mistral."""
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+            text_chars, image_ids, n_images = 0, [], 0
+            for message in body.get("messages", []):
+                content = message.get("content")
+                if isinstance(content, str):
+                    text_chars += len(content)
+                    continue
+                for item in content or []:
+                    if item.get("type") == "text":
+                        text_chars += len(item["text"])
+                        match = re.match(r"ID : (\S+)", item["text"])
+                        if match:
+                            image_ids.append(match.group(1))
+                    elif item.get("type") == "image_url":
+                        n_images += 1
+
+            if server_max_images and n_images > server_max_images:
+                # Imite le refus d'une requête trop volumineuse
+                stats.record(0, 0)
+                self.send_error(413, "Request payload too large")
+                return
+
+            time.sleep(base_latency + image_latency * n_images)
+
+            if image_ids:
+                records = [
+                    {"id": image_id, **fake_receipt(i)}
+                    for i, image_id in enumerate(image_ids)
+                    if random.random() >= drop_rate
+                ]
+                content = json.dumps({"receipts": records})
+            else:
+                content = json.dumps(fake_receipt(0))
+
+            prompt_tokens = text_chars // CHARS_PER_TOKEN + TOKENS_PER_IMAGE * n_images
+            completion_tokens = len(content) // CHARS_PER_TOKEN
+            stats.record(prompt_tokens, completion_tokens)
+
+            response = json.dumps({
+                "id": f"stub-{stats.requests}",
+                "object": "chat.completion",
+                "model": body.get("model", "stub"),
+                "created": int(time.time()),
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                },
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }]
+            }).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+def run_benchmark(n_receipts, batch_sizes, base_latency, image_latency, drop_rate, image_kb,
+                  server_max_images=None):
+    """Compare débit et coût par facture pour différentes tailles de lot."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_paths = []
+        for i in range(n_receipts):
+            image_path = os.path.join(temp_dir, f"receipt_{i}.jpg")
+            with open(image_path, "wb") as f:
+                f.write(os.urandom(image_kb * 1024))
+            image_paths.append(image_path)
+
+        print(f"{'K':>3} {'requêtes':>9} {'factures/s':>11} {'tokens/facture':>15} {'échecs':>7}")
+        for batch_size in batch_sizes:
+            stats = StubStats()
+            server = ThreadingHTTPServer(
+                ("127.0.0.1", 0),
+                make_handler(stats, base_latency, image_latency, drop_rate, server_max_images)
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            server_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+            output_dir = os.path.join(temp_dir, f"doc_json_{batch_size}")
+            start = time.perf_counter()
+            results = extract_receipts_batch(
+                "stub-key", image_paths, output_dir,
+                batch_size=batch_size, server_url=server_url
+            )
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            server.server_close()
+
+            failures = sum(1 for data in results.values() if data is None)
+            # K affiché = taille de lot réellement envoyée (plafonnée par l'API)
+            print(
+                f"{effective_batch_size(batch_size):>3} {stats.requests:>9} {n_receipts / elapsed:>11.1f} "
+                f"{(stats.prompt_tokens + stats.completion_tokens) / n_receipts:>15.0f} {failures:>7}"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'extraction groupée sur un serveur simulé")
+    parser.add_argument("--receipts", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--base-latency", type=float, default=0.2, help="latence fixe par requête (s)")
+    parser.add_argument("--image-latency", type=float, default=0.05, help="latence par image (s)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="part des factures omises dans les lots")
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--server-max-images", type=int, default=None,
+                        help="le serveur refuse (413) les requêtes contenant plus d'images")
+    parser.add_argument("--null-fields", nargs="*", default=[],
+                        help="champs renvoyés à null par le serveur (ex. time adresse)")
+    args = parser.parse_args()
+
+    NULL_FIELDS = tuple(args.null_fields)
+
+    random.seed(0)
+    run_benchmark(args.receipts, args.batch_sizes, args.base_latency,
+                  args.image_latency, args.drop_rate, args.image_kb, args.server_max_images)
@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+
+# Modules dont l'import doit être différé jusqu'à l'étape qui en a besoin
+HEAVY_MODULES = ("pandas", "numpy", "sklearn", "scipy", "mistralai", "PIL")
+
+# Remplace streamlit par un objet inerte pour exécuter appli.py hors serveur :
+# tout attribut ou appel renvoie un stub, les décorateurs renvoient la
+# fonction décorée, st.columns/st.tabs renvoient autant de stubs que demandé,
+# st.session_state est un simple espace de noms et les boutons ne sont jamais
+# cliqués.
+STREAMLIT_STUB = """
+import sys, types
+
+class _Stub:
+    def __getattr__(self, name):
+        return _Stub()
+    def __call__(self, *args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        if args and isinstance(args[0], int):
+            return tuple(_Stub() for _ in range(args[0]))
+        if args and isinstance(args[0], (list, tuple)):
+            return tuple(_Stub() for _ in args[0])
+        return _Stub()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __bool__(self):
+        return False
+    def __contains__(self, item):
+        return False
+
+class _SessionState(types.SimpleNamespace):
+    def __contains__(self, key):
+        return key in self.__dict__
+
+streamlit = types.ModuleType("streamlit")
+streamlit.__getattr__ = lambda name: _Stub()
+streamlit.session_state = _SessionState()
+sys.modules["streamlit"] = streamlit
+"""
+
+def import_code(module):
+    """Code exécuté par le sous-processus pour importer le module."""
+    if module == "appli":
+        return STREAMLIT_STUB + "\nimport appli"
+    return f"import {module}"
+
+def measure_import(module, script_dir=None):
+    """Importe un module via `python -X importtime` et retourne {module: temps cumulé en µs}.
+
+    Lève RuntimeError si l'import échoue.
+    """
+    script_dir = script_dir or os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", import_code(module)],
+        cwd=script_dir,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError("\n".join(errors[-5:]))
+
+    timings = {}
+    for line in completed.stderr.splitlines():
+        # Format : "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+def check_import_budget(module="main", budget_ms=150):
+    """Vérifie que l'import du module reste sous le budget et ne charge aucune dépendance lourde.
+
+    Pour "appli", streamlit est remplacé par un stub : seul le coût propre
+    au script (et à ses imports, dont shared_cache) est mesuré.
+    """
+    try:
+        timings = measure_import(module)
+    except RuntimeError as e:
+        print(f"Erreur : l'import de '{module}' a échoué\n{e}")
+        return False
+    total_ms = timings.get(module, 0) / 1000
+
+    loaded_heavy = sorted(
+        {name.split(".")[0] for name in timings} & set(HEAVY_MODULES)
+    )
+
+    print(f"Import de '{module}' : {total_ms:.1f} ms (budget : {budget_ms} ms)")
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:10]
+    for name, cumulative in slowest:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    errors = []
+    if loaded_heavy:
+        errors.append(f"dépendances lourdes importées : {', '.join(loaded_heavy)}")
+    if total_ms > budget_ms:
+        errors.append(f"budget dépassé ({total_ms:.1f} ms > {budget_ms} ms)")
+
+    for error in errors:
+        print(f"Erreur : {error}")
+    return not errors
+
+if __name__ == "__main__":
+    # Usage : python bench_import_time.py [module|appli] [budget_ms]
+    module = sys.argv[1] if len(sys.argv) > 1 else "main"
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 150
+    sys.exit(0 if check_import_budget(module, budget_ms) else 1)
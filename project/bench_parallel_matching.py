@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from comparaison_data import compare_uploaded_data, compare_uploaded_data_parallel
+
+VENDORS = ["CARREFOUR", "MONOPRIX", "SNCF", "TOTAL ENERGIES", "FNAC", "AMAZON", "UBER", "PICARD"]
+
+def generate_year(base_dir, n_accounts, rows_per_account, n_receipts, year=2024):
+    """Génère une année de relevés multi-comptes et des factures associées."""
+    csv_dir = os.path.join(base_dir, "statements")
+    json_dir = os.path.join(base_dir, "doc_json")
+    img_dir = os.path.join(base_dir, "receipts")
+    for folder in (csv_dir, json_dir, img_dir):
+        os.makedirs(folder, exist_ok=True)
+
+    first_day = date(year, 1, 1)
+    all_rows = []
+    for account in range(n_accounts):
+        rows = [{
+            "Date": (first_day + timedelta(days=random.randint(0, 364))).isoformat(),
+            "Amount": round(random.uniform(1, 300), 2),
+            "Vendor": random.choice(VENDORS),
+            "Account": f"FR76-{account:04d}"
+        } for _ in range(rows_per_account)]
+        pd.DataFrame(rows).to_csv(os.path.join(csv_dir, f"account_{account}.csv"), index=False)
+        all_rows.extend(rows)
+
+    for i in range(n_receipts):
+        row = random.choice(all_rows)
+        receipt_date = date.fromisoformat(row["Date"]) + timedelta(days=random.randint(-5, 5))
+        receipt = {
+            "date": receipt_date.strftime("%m/%d/%Y"),
+            "time": "12:00",
+            "currency": "EUR",
+            "vendor": row["Vendor"],
+            "amount": str(row["Amount"]),
+            "adresse": ""
+        }
+        with open(os.path.join(json_dir, f"receipt_{i}.json"), "w", encoding="utf-8") as f:
+            json.dump(receipt, f)
+        open(os.path.join(img_dir, f"receipt_{i}.jpg"), "wb").close()
+
+    return csv_dir, json_dir, img_dir
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du rapprochement parallèle partitionné")
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--rows-per-account", type=int, default=2000)
+    parser.add_argument("--receipts", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--max-date-diff", type=int, default=31)
+    parser.add_argument("--sequential", action="store_true",
+                        help="exécute aussi compare_uploaded_data et compare les résultats")
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_dir, json_dir, img_dir = generate_year(
+            temp_dir, args.accounts, args.rows_per_account, args.receipts
+        )
+
+        reference = None
+        if args.sequential:
+            output = os.path.join(temp_dir, "sequential.csv")
+            elapsed = timed(compare_uploaded_data, csv_dir, json_dir, output, img_dir)
+            reference = pd.read_csv(output)
+            reference = reference[reference["date_difference"] <= args.max_date_diff]
+            print(f"séquentiel      : {elapsed:7.2f} s")
+
+        baseline = None
+        for n_workers in args.workers:
+            output = os.path.join(temp_dir, f"parallel_{n_workers}.csv")
+            elapsed = timed(compare_uploaded_data_parallel, csv_dir, json_dir, output, img_dir,
+                            n_workers=n_workers, max_date_diff=args.max_date_diff)
+            baseline = baseline or elapsed
+            print(f"{n_workers:2d} processus    : {elapsed:7.2f} s  (accélération x{baseline / elapsed:.2f})")
+
+            if reference is not None:
+                result = pd.read_csv(output)
+                same = result.reset_index(drop=True).equals(reference.reset_index(drop=True))
+                print(f"  identique au séquentiel : {'oui' if same else 'non'}")
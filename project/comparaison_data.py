@@ -1,52 +1,105 @@
 import pandas as pd
+import numpy as np
 import os
 import glob
+import io
 import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from functools import lru_cache
+from multiprocessing import shared_memory
+from shared_cache import content_hash
 
-def calculate_similarity(text1, text2):
-    if pd.isna(text1) or pd.isna(text2):
-        return 0.0
-    
+# Colonnes reconnues comme identifiant de compte dans les relevés
+ACCOUNT_COLUMNS = ('account', 'compte', 'account_number', 'numero_de_compte')
+
+@lru_cache(maxsize=None)
+def _sklearn_tools():
+    """Importe scikit-learn à la première comparaison (import coûteux)."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    return TfidfVectorizer, cosine_similarity
+
+def _tfidf_similarity(text1, text2):
+    """Similarité TF-IDF (cosinus) de deux libellés."""
     try:
-        vectorizer = TfidfVectorizer().fit_transform([str(text1), str(text2)])
+        TfidfVectorizer, cosine_similarity = _sklearn_tools()
+        vectorizer = TfidfVectorizer().fit_transform([text1, text2])
         vectors = vectorizer.toarray()
         return cosine_similarity([vectors[0]], [vectors[1]])[0][0]
     except:
         return 0.0
 
-def compare_uploaded_data(csv_folder, json_folder, output_file, img_folder):
-    results = []
+# Sans SharedCache (processus du mode parallèle), mémorisation bornée par processus
+_vendor_similarity = lru_cache(maxsize=100_000)(_tfidf_similarity)
+
+def calculate_similarity(text1, text2, cache=None):
+    if pd.isna(text1) or pd.isna(text2):
+        return 0.0
     
-    # Charger tous les relevés bancaires
+    text1, text2 = str(text1), str(text2)
+    if cache is None:
+        return _vendor_similarity(text1, text2)
+    # Namespace 'vendor' du cache partagé : limite mémoire, expiration et
+    # statistiques ; en mémoire seulement (une valeur par paire de libellés)
+    return cache.get_or_compute(
+        'vendor', content_hash(text1, text2),
+        lambda: _tfidf_similarity(text1, text2), persist=False
+    )
+
+def parse_statement(data):
+    """Lit un relevé CSV (contenu brut) et normalise les noms de colonnes."""
+    df = pd.read_csv(io.BytesIO(data))
+    df.columns = df.columns.str.lower().str.replace(' ', '_')
+    return df
+
+def read_bank_statements(csv_folder, cache=None):
+    """Charge et normalise tous les relevés bancaires d'un dossier.
+
+    Retourne (bank_df, empreinte de l'ensemble des relevés). Avec un
+    SharedCache, chaque relevé n'est analysé qu'une fois par contenu.
+    """
     bank_df = pd.DataFrame()
+    file_hashes = []
     for csv_file in glob.glob(os.path.join(csv_folder, "*.csv")):
         try:
-            df = pd.read_csv(csv_file)
-            df.columns = df.columns.str.lower().str.replace(' ', '_')
+            with open(csv_file, 'rb') as f:
+                data = f.read()
+            file_hash = content_hash(data)
+            if cache is not None:
+                df = cache.get_or_compute('statement', file_hash, lambda: parse_statement(data))
+            else:
+                df = parse_statement(data)
             bank_df = pd.concat([bank_df, df], ignore_index=True)
+            file_hashes.append(file_hash)
         except Exception as e:
             print(f"Erreur avec le fichier {csv_file}: {e}")
             continue
     
+    statements_key = content_hash(*file_hashes)
     if bank_df.empty:
-        print("Aucune donnée bancaire valide trouvée")
-        return False
+        return bank_df, statements_key
     
     # Convertir les colonnes essentielles
     bank_df['date'] = pd.to_datetime(bank_df['date'], errors='coerce')
     bank_df['amount'] = pd.to_numeric(bank_df['amount'], errors='coerce')
-    
-    # Créer un mapping des images disponibles
-    image_files = {
+    return bank_df, statements_key
+
+def load_bank_data(csv_folder, cache=None):
+    """Charge et normalise tous les relevés bancaires d'un dossier."""
+    return read_bank_statements(csv_folder, cache)[0]
+
+def list_images(img_folder):
+    """Crée un mapping des images disponibles (nom sans extension -> chemin)."""
+    return {
         os.path.splitext(f)[0].lower(): os.path.join(img_folder, f)
         for f in os.listdir(img_folder)
         if f.lower().endswith(('.jpg', '.jpeg', '.png'))
     }
-    
-    # Traiter chaque fichier JSON de facture
+
+def load_receipts(json_folder):
+    """Charge les factures JSON exploitables (montant et date valides)."""
+    receipts = []
     for json_file in glob.glob(os.path.join(json_folder, "*.json")):
         try:
             with open(json_file, 'r', encoding='utf-8') as f:
@@ -54,54 +107,259 @@ def compare_uploaded_data(csv_folder, json_folder, output_file, img_folder):
             
             if not all(k in json_data for k in ['amount', 'date']):
                 continue
-                
-            json_amount = float(json_data['amount'])
-            json_date = datetime.strptime(json_data['date'], '%m/%d/%Y')
             
-            # Rechercher dans les relevés bancaires
-            for _, csv_row in bank_df.iterrows():
-                if pd.isna(csv_row['amount']) or pd.isna(csv_row['date']):
-                    continue
-                    
-                if abs(float(csv_row['amount']) - json_amount) < 0.01:
-                    date_diff = abs((csv_row['date'] - json_date).days)
-                    vendor_sim = calculate_similarity(
-                        csv_row.get('vendor', ''),
-                        json_data.get('vendor', '')
-                    )
-                    
-                    # Chercher l'image correspondante
-                    base_name = os.path.splitext(os.path.basename(json_file))[0].lower()
-                    img_path = image_files.get(base_name)
-                    
-                    # Construction du résultat
-                    result = {
-                        'json_file': os.path.basename(json_file),
-                        'similarity_score': vendor_sim,
-                        'date_difference': date_diff,
-                        'amount': json_amount,
-                        'date': csv_row['date'].strftime('%Y-%m-%d'),
-                        'vendor': str(csv_row.get('vendor', ''))
-                    }
-                    
-                    if img_path:
-                        result['image_path'] = os.path.basename(img_path)
-                    
-                    # Ajout des autres colonnes
-                    for col in csv_row.index:
-                        if col not in result:
-                            result[col] = csv_row[col]
-                    
-                    results.append(result)
-                    
+            receipts.append({
+                'json_file': json_file,
+                'amount': float(json_data['amount']),
+                'date': datetime.strptime(json_data['date'], '%m/%d/%Y'),
+                'vendor': json_data.get('vendor', '')
+            })
         except Exception as e:
             print(f"Erreur avec le fichier {json_file}: {e}")
             continue
+    return receipts
+
+def build_result(receipt, csv_row, date_diff, vendor_sim, image_files):
+    """Construit une ligne de résultat à partir d'une facture et d'une ligne de relevé."""
+    # Chercher l'image correspondante
+    base_name = os.path.splitext(os.path.basename(receipt['json_file']))[0].lower()
+    img_path = image_files.get(base_name)
+    
+    # Construction du résultat
+    result = {
+        'json_file': os.path.basename(receipt['json_file']),
+        'similarity_score': vendor_sim,
+        'date_difference': date_diff,
+        'amount': receipt['amount'],
+        'date': csv_row['date'].strftime('%Y-%m-%d'),
+        'vendor': str(csv_row.get('vendor', ''))
+    }
+    
+    if img_path:
+        result['image_path'] = os.path.basename(img_path)
     
-    # Sauvegarde des résultats
+    # Ajout des autres colonnes
+    for col in csv_row.index:
+        if col not in result:
+            result[col] = csv_row[col]
+    
+    return result
+
+def save_results(results, output_file):
+    """Sauvegarde des résultats."""
     if results:
         result_df = pd.DataFrame(results)
         result_df.to_csv(output_file, index=False)
         return True
     
-    return False
\ No newline at end of file
+    return False
+
+def build_bank_index(bank_df, account_column=None):
+    """Construit l'index de rapprochement : lignes valides triées par (compte, date).
+
+    Retourne un dict contenant le DataFrame trié et les colonnes NumPy
+    alignées (comptes, jours, montants, fournisseurs).
+    """
+    bank_df = bank_df.dropna(subset=['amount', 'date'])
+    
+    if account_column is None:
+        account_column = next((col for col in ACCOUNT_COLUMNS if col in bank_df.columns), None)
+    if account_column:
+        accounts = np.asarray(bank_df[account_column].astype(str), dtype=str)
+    else:
+        accounts = np.full(len(bank_df), '', dtype='U1')
+    
+    # Tri par (compte, date) : chaque partition est une plage contiguë
+    order = np.lexsort((np.asarray(bank_df['date'], dtype='datetime64[ns]'), accounts))
+    bank_df = bank_df.iloc[order]
+    
+    if 'vendor' in bank_df.columns:
+        vendors = np.asarray(bank_df['vendor'].fillna('').astype(str), dtype=str)
+    else:
+        vendors = np.full(len(bank_df), '', dtype='U1')
+    
+    return {
+        'bank_df': bank_df,
+        'accounts': accounts[order],
+        'days': np.asarray(bank_df['date'], dtype='datetime64[D]').astype(np.int64),
+        'amounts': np.asarray(bank_df['amount'], dtype=np.float64),
+        'vendors': vendors
+    }
+
+def get_bank_index(bank_df, statements_key, cache=None, account_column=None):
+    """Retourne l'index des relevés, réutilisé via le cache pour un même contenu."""
+    if cache is None:
+        return build_bank_index(bank_df, account_column)
+    return cache.get_or_compute(
+        'index', content_hash(statements_key, repr(account_column)),
+        lambda: build_bank_index(bank_df, account_column)
+    )
+
+def compare_uploaded_data(csv_folder, json_folder, output_file, img_folder, cache=None):
+    results = []
+    
+    # Charger tous les relevés bancaires
+    bank_df, statements_key = read_bank_statements(csv_folder, cache)
+    if bank_df.empty:
+        print("Aucune donnée bancaire valide trouvée")
+        return False
+    
+    # Index des lignes valides (mis en cache pour des relevés identiques)
+    index = get_bank_index(bank_df, statements_key, cache)
+    indexed_df, amounts = index['bank_df'], index['amounts']
+    original_order = indexed_df.index.values
+    
+    image_files = list_images(img_folder)
+    
+    # Traiter chaque facture
+    for receipt in load_receipts(json_folder):
+        try:
+            # Rechercher dans les relevés bancaires, dans l'ordre d'origine des lignes
+            candidates = np.flatnonzero(np.abs(amounts - receipt['amount']) < 0.01)
+            for pos in candidates[np.argsort(original_order[candidates])]:
+                csv_row = indexed_df.iloc[pos]
+                date_diff = abs((csv_row['date'] - receipt['date']).days)
+                vendor_sim = calculate_similarity(
+                    csv_row.get('vendor', ''),
+                    receipt['vendor'],
+                    cache
+                )
+                results.append(build_result(receipt, csv_row, date_diff, vendor_sim, image_files))
+                
+        except Exception as e:
+            print(f"Erreur avec le fichier {receipt['json_file']}: {e}")
+            continue
+    
+    return save_results(results, output_file)
+
+# --- Rapprochement parallèle par partitions -----------------------------------
+
+# Colonnes partagées avec les processus de travail (attachées une fois par processus)
+_shared_columns = {}
+
+def _to_shared(array, blocks):
+    """Copie un tableau NumPy dans un segment de mémoire partagée."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(shm)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm.name, array.shape, array.dtype.str
+
+def _attach_shared(specs):
+    """Initialise un processus de travail en s'attachant aux colonnes partagées."""
+    for column, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared_columns[column] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+
+def _match_partition(task):
+    """Rapproche les factures d'une partition avec la plage [lo, hi) des colonnes triées."""
+    lo, hi, receipts, max_date_diff = task
+    amounts = _shared_columns['amount'][1][lo:hi]
+    days = _shared_columns['day'][1][lo:hi]
+    vendors = _shared_columns['vendor'][1][lo:hi]
+    
+    matches = []
+    for receipt_pos, amount, day, vendor in receipts:
+        candidates = np.flatnonzero(
+            (np.abs(amounts - amount) < 0.01) & (np.abs(days - day) <= max_date_diff)
+        )
+        for i in candidates:
+            vendor_sim = calculate_similarity(str(vendors[i]), vendor)
+            matches.append((receipt_pos, lo + int(i), int(abs(days[i] - day)), vendor_sim))
+    return matches
+
+def plan_partitions(accounts, days, receipt_days, partition_days, margin_days):
+    """Découpe les lignes triées par (compte, date) en partitions avec marges.
+
+    Chaque facture est affectée à une seule période de partition_days jours ;
+    les lignes bancaires de la partition couvrent cette période élargie de
+    margin_days jours de chaque côté, pour ne pas perdre les rapprochements
+    situés de part et d'autre d'une frontière.
+    Retourne une liste de (lo, hi, positions des factures).
+    """
+    if len(receipt_days) == 0:
+        return []
+    
+    first_day = int(min(days.min(), receipt_days.min()))
+    receipt_periods = (receipt_days - first_day) // partition_days
+    
+    partitions = []
+    bounds = np.flatnonzero(np.r_[True, accounts[1:] != accounts[:-1], True])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        account_days = days[start:end]
+        for period in np.unique(receipt_periods):
+            period_start = first_day + int(period) * partition_days
+            lo = start + int(np.searchsorted(account_days, period_start - margin_days, side='left'))
+            hi = start + int(np.searchsorted(account_days, period_start + partition_days + margin_days, side='left'))
+            if lo < hi:
+                partitions.append((lo, hi, np.flatnonzero(receipt_periods == period)))
+    return partitions
+
+def compare_uploaded_data_parallel(csv_folder, json_folder, output_file, img_folder,
+                                   n_workers=None, max_date_diff=31, partition_days=31,
+                                   account_column=None, cache=None):
+    """Rapprochement en parallèle, partitionné par compte et par période.
+
+    Contrairement à compare_uploaded_data, seules les lignes bancaires à moins
+    de max_date_diff jours de la facture sont considérées. Les colonnes
+    utiles (montant, jour, fournisseur) sont placées en mémoire partagée et
+    chaque processus ne reçoit que les bornes de sa partition. Le résultat
+    est trié par facture puis par ligne de relevé, indépendamment de l'ordre
+    d'exécution des partitions. Avec un SharedCache, l'index des relevés
+    est réutilisé tant que leur contenu est identique.
+    """
+    bank_df, statements_key = read_bank_statements(csv_folder, cache)
+    if bank_df.empty:
+        print("Aucune donnée bancaire valide trouvée")
+        return False
+    
+    index = get_bank_index(bank_df, statements_key, cache, account_column)
+    bank_df, accounts, days, vendors = index['bank_df'], index['accounts'], index['days'], index['vendors']
+    
+    receipts = load_receipts(json_folder)
+    if bank_df.empty or not receipts:
+        return False
+    
+    image_files = list_images(img_folder)
+    receipt_days = np.array(
+        [np.datetime64(r['date'], 'D').astype(np.int64) for r in receipts], dtype=np.int64
+    )
+    
+    partitions = plan_partitions(accounts, days, receipt_days, partition_days, max_date_diff)
+    
+    blocks = []
+    try:
+        specs = {
+            'amount': _to_shared(index['amounts'], blocks),
+            'day': _to_shared(days, blocks),
+            'vendor': _to_shared(vendors, blocks)
+        }
+        tasks = [
+            (lo, hi, [(int(pos), receipts[pos]['amount'], int(receipt_days[pos]),
+                       receipts[pos]['vendor']) for pos in positions], max_date_diff)
+            for lo, hi, positions in partitions
+        ]
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach_shared,
+                                 initargs=(specs,)) as executor:
+            matches = [m for partition in executor.map(_match_partition, tasks) for m in partition]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    
+    # Fusion : suppression des doublons de frontière et ordre déterministe
+    # (facture, puis ligne dans l'ordre d'origine des relevés)
+    merged = {}
+    for receipt_pos, row_pos, date_diff, vendor_sim in matches:
+        key = (receipt_pos, bank_df.index[row_pos])
+        merged.setdefault(key, (row_pos, date_diff, vendor_sim))
+    
+    results = []
+    for (receipt_pos, _), (row_pos, date_diff, vendor_sim) in sorted(merged.items()):
+        try:
+            results.append(build_result(
+                receipts[receipt_pos], bank_df.iloc[row_pos], date_diff, vendor_sim, image_files
+            ))
+        except Exception as e:
+            print(f"Erreur avec le fichier {receipts[receipt_pos]['json_file']}: {e}")
+    
+    return save_results(results, output_file)
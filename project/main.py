@@ -1,13 +1,21 @@
 import os
-import pandas as pd
-from dotenv import load_dotenv
-from image_processing import needs_enhancement, enhance_image
-from receipt_extraction import extract_receipt_data
-from bank_statement_processing import load_bank_statements_from_files
-from comparaison_data import compare_uploaded_data
 
-def process_uploads(receipts_dir, statements_dir, output_csv):
-    """Traite les fichiers uploadés pour le rapprochement"""
+# Les dépendances lourdes (pandas, scikit-learn, SDK Mistral, PIL) sont importées
+# dans les fonctions qui les utilisent : Streamlit ré-exécute appli.py à chaque
+# interaction et l'import de ce module doit rester quasi instantané.
+
+def process_uploads(receipts_dir, statements_dir, output_csv, batch_size=1, n_workers=1, cache=None):
+    """Traite les fichiers uploadés pour le rapprochement
+
+    batch_size > 1 regroupe les factures par requête d'extraction.
+    n_workers > 1 répartit le rapprochement sur plusieurs processus.
+    cache (SharedCache) réutilise les relevés et index déjà construits.
+    """
+    from dotenv import load_dotenv
+    from image_processing import needs_enhancement, enhance_image
+    from receipt_extraction import extract_receipts_batch
+    from comparaison_data import compare_uploaded_data, compare_uploaded_data_parallel
+
     load_dotenv()
     api_key = os.getenv("mistral_key")
 
@@ -19,6 +27,7 @@ def process_uploads(receipts_dir, statements_dir, output_csv):
     os.makedirs(output_json, exist_ok=True)
 
     # Traitement des factures
+    img_paths = []
     for filename in os.listdir(receipts_dir):
         if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
             img_path = os.path.join(receipts_dir, filename)
@@ -28,13 +37,21 @@ def process_uploads(receipts_dir, statements_dir, output_csv):
                 enhance_image(img_path, enhanced_path)
                 img_path = enhanced_path
             
-            extract_receipt_data(api_key, img_path, output_json)
+            img_paths.append(img_path)
+
+    extract_receipts_batch(api_key, img_paths, output_json, batch_size=batch_size)
 
     # Traitement des relevés et comparaison
-    compare_uploaded_data(statements_dir, output_json, output_csv, receipts_dir)
+    if n_workers > 1:
+        compare_uploaded_data_parallel(statements_dir, output_json, output_csv, receipts_dir,
+                                       n_workers=n_workers, cache=cache)
+    else:
+        compare_uploaded_data(statements_dir, output_json, output_csv, receipts_dir, cache=cache)
 
 def search_receipts_from_uploads(csv_path, images_dir):
     """Recherche des images de factures correspondantes à partir des uploads"""
+    import pandas as pd
+
     results = []
     
     try:
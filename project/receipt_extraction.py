@@ -1,28 +1,51 @@
-from mistralai import Mistral
 import os
 import json
+from datetime import datetime
+from functools import lru_cache
 from image_processing import encode_image
 
+MODEL = "pixtral-large-2411"
+
+# Champs attendus pour chaque facture (voir context.txt)
+RECEIPT_FIELDS = ("date", "time", "currency", "vendor", "amount", "adresse")
+
+# Format de date attendu par le rapprochement (comparaison_data.load_receipts)
+RECEIPT_DATE_FORMAT = "%m/%d/%Y"
+
+# Limites d'une requête groupée : nombre d'images et taille cumulée en base64
+MAX_IMAGES_PER_REQUEST = 8
+MAX_REQUEST_BYTES = 10 * 1024 * 1024
+
+# Indices d'un refus pour requête trop volumineuse (HTTP 400)
+SIZE_ERROR_HINTS = ("too large", "too long", "too many", "payload", "context length",
+                    "context_length", "maximum context", "exceed", "token limit")
+
+@lru_cache(maxsize=None)
+def get_client(api_key, server_url=None):
+    """Retourne un client Mistral partagé (SDK importé au premier appel)."""
+    from mistralai import Mistral
+    if server_url:
+        return Mistral(api_key=api_key, server_url=server_url)
+    return Mistral(api_key=api_key)
+
+@lru_cache(maxsize=None)
+def _load_context():
+    """Lit context.txt ; seule une lecture réussie est mise en cache."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    context_path = os.path.join(script_dir, "context.txt")
+    with open(context_path, "r", encoding='utf-8') as file:
+        return file.read()
+
 def read_context():
     """Lit le contenu du fichier context.txt et retourne le texte."""
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        context_path = os.path.join(script_dir, "context.txt")
-        with open(context_path, "r", encoding='utf-8') as file:
-            return file.read()
+        return _load_context()
     except Exception as e:
         print(f"Erreur lors de la lecture de context.txt : {e}")
         return None
 
-def extract_receipt_data(api_key, image_path, output_dir="project/doc_json"):
-    """Extrait les données d'une facture à partir d'une image."""
-    model = "pixtral-large-2411"
-    client = Mistral(api_key=api_key)
-    
-    # Création du dossier de sortie si inexistant
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Gestion du nom de fichier (supprime 'enhanced_' si présent)
+def get_json_path(image_path, output_dir):
+    """Chemin du JSON d'une facture (supprime 'enhanced_' si présent)."""
     original_filename = os.path.basename(image_path)
     if original_filename.startswith('enhanced_'):
         json_basename = original_filename.replace('enhanced_', '', 1)
@@ -30,7 +53,53 @@ def extract_receipt_data(api_key, image_path, output_dir="project/doc_json"):
         json_basename = original_filename
     
     json_filename = f"{os.path.splitext(json_basename)[0]}.json"
-    json_path = os.path.join(output_dir, json_filename)
+    return os.path.join(output_dir, json_filename)
+
+def parse_json_response(content):
+    """Convertit la réponse texte du modèle en objet Python."""
+    # Nettoyage des éventuels caractères d'échappement
+    if content.startswith('"') and content.endswith('"'):
+        content = content[1:-1].replace('\\"', '"')
+    return json.loads(content)
+
+def format_receipt(receipt_data):
+    """Formatage final selon la structure attendue (un champ null devient "")."""
+    formatted_data = {}
+    for field in RECEIPT_FIELDS:
+        value = receipt_data.get(field)
+        formatted_data[field] = "" if value is None else value
+    return formatted_data
+
+def is_valid_receipt(formatted_data):
+    """Vérifie qu'une facture est exploitable par le rapprochement.
+
+    La date doit suivre RECEIPT_DATE_FORMAT et le montant être un nombre ;
+    les autres champs peuvent être vides.
+    """
+    if not isinstance(formatted_data, dict):
+        return False
+    if any(not isinstance(formatted_data.get(field, ""), (str, int, float)) for field in RECEIPT_FIELDS):
+        return False
+    try:
+        datetime.strptime(str(formatted_data.get("date", "")), RECEIPT_DATE_FORMAT)
+        float(formatted_data.get("amount"))
+    except (TypeError, ValueError):
+        return False
+    return True
+
+def save_receipt(formatted_data, json_path):
+    """Sauvegarde dans un fichier JSON."""
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(formatted_data, f, indent=4, ensure_ascii=False)
+    print(f"Données sauvegardées dans {json_path}")
+
+def extract_receipt_data(api_key, image_path, output_dir="project/doc_json", server_url=None):
+    """Extrait les données d'une facture à partir d'une image."""
+    client = get_client(api_key, server_url)
+    
+    # Création du dossier de sortie si inexistant
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = get_json_path(image_path, output_dir)
 
     base64_image = encode_image(image_path)
     if not base64_image:
@@ -63,113 +132,169 @@ def extract_receipt_data(api_key, image_path, output_dir="project/doc_json"):
 
     try:
         chat_response = client.chat.complete(
-            model=model,
+            model=MODEL,
             messages=messages,
             response_format={"type": "json_object"}
         )
         
         # Récupération et traitement de la réponse
-        receipt_data_str = chat_response.choices[0].message.content
-        
-        # Nettoyage des éventuels caractères d'échappement
-        if receipt_data_str.startswith('"') and receipt_data_str.endswith('"'):
-            receipt_data_str = receipt_data_str[1:-1].replace('\\"', '"')
-        
-        # Conversion en dict Python
-        receipt_data = json.loads(receipt_data_str)
-        
-        # Formatage final selon la structure attendue
-        formatted_data = {
-            "date": receipt_data.get("date", ""),
-            "time": receipt_data.get("time", ""),
-            "currency": receipt_data.get("currency", ""),
-            "vendor": receipt_data.get("vendor", ""),
-            "amount": receipt_data.get("amount", ""),
-            "adresse": receipt_data.get("adresse", "")
-        }
-        
-        # Sauvegarde dans un fichier JSON
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_data, f, indent=4, ensure_ascii=False)
-        
-        print(f"Données sauvegardées dans {json_path}")
+        receipt_data = parse_json_response(chat_response.choices[0].message.content)
+        formatted_data = format_receipt(receipt_data)
+        if not is_valid_receipt(formatted_data):
+            print(f"Facture inexploitable (date ou montant invalide) : {image_path}")
+            return None
+        save_receipt(formatted_data, json_path)
         return formatted_data
         
     except Exception as e:
         print(f"Erreur lors de l'extraction des données de la facture : {e}")
         return None
-    """Extrait les données d'une facture à partir d'une image."""
-    model = "pixtral-large-2411"
-    client = Mistral(api_key=api_key)
-    
-    # Création du dossier de sortie si inexistant
-    os.makedirs(output_dir, exist_ok=True)
-    
-    json_filename = f"{os.path.splitext(os.path.basename(image_path))[0]}.json"
-    json_path = os.path.join(output_dir, json_filename)
 
-    base64_image = encode_image(image_path)
-    if not base64_image:
-        return None
+def effective_batch_size(batch_size):
+    """Taille de lot réellement utilisée (au plus MAX_IMAGES_PER_REQUEST images)."""
+    return max(1, min(batch_size, MAX_IMAGES_PER_REQUEST))
 
-    context_text = read_context()
-    if not context_text:
-        return None
+def split_batches(encoded_images, batch_size, max_bytes=MAX_REQUEST_BYTES):
+    """Découpe les images en lots d'au plus batch_size images et max_bytes octets."""
+    batch_size = effective_batch_size(batch_size)
+    batches = []
+    current, current_bytes = [], 0
+    for image_path, base64_image in encoded_images:
+        size = len(base64_image)
+        if current and (len(current) >= batch_size or current_bytes + size > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append((image_path, base64_image))
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
 
+def is_size_error(error):
+    """Indique si l'API a refusé la requête à cause de sa taille."""
+    status_code = getattr(error, "status_code", None)
+    if status_code == 413:
+        return True
+    if status_code == 400:
+        message = f"{error} {getattr(error, 'body', '')}".lower()
+        return any(hint in message for hint in SIZE_ERROR_HINTS)
+    return False
+
+def request_batch(client, context_text, batch):
+    """Envoie un lot d'images en une seule requête.
+
+    Retourne (id_to_image, records) : {image_id: (chemin, base64)} pour le lot
+    et {image_id: données brutes} pour les éléments présents dans la réponse.
+    """
+    image_ids = [f"img_{i}" for i in range(len(batch))]
+
+    user_content = []
+    for image_id, (_, base64_image) in zip(image_ids, batch):
+        user_content.append({"type": "text", "text": f"ID : {image_id}"})
+        user_content.append({
+            "type": "image_url",
+            "image_url": f"data:image/jpeg;base64,{base64_image}"
+        })
+
+    instructions = (
+        f"\n\nImportant : tu reçois {len(batch)} reçus, chacun précédé de son identifiant. "
+        "Retourne uniquement un objet JSON de la forme "
+        '{"receipts": [{"id": "img_0", "date": "", "time": "", "currency": "", '
+        '"vendor": "", "amount": "", "adresse": ""}, ...]} '
+        "avec exactement un élément par identifiant, sans commentaires ni texte supplémentaire."
+    )
     messages = [
         {
             "role": "system",
-            "content": [
-                {
-                    "type": "text",
-                    "text": context_text + "\n\nImportant : Retourne uniquement le JSON formaté exactement comme dans l'exemple, sans commentaires ni texte supplémentaire."
-                }
-            ]
+            "content": [{"type": "text", "text": context_text + instructions}]
         },
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "image_url",
-                    "image_url": f"data:image/jpeg;base64,{base64_image}"
-                }
-            ]
-        }
+        {"role": "user", "content": user_content}
     ]
 
-    try:
-        chat_response = client.chat.complete(
-            model=model,
-            messages=messages,
-            response_format={"type": "json_object"}
-        )
-        
-        # Récupération et traitement de la réponse
-        receipt_data_str = chat_response.choices[0].message.content
-        
-        # Nettoyage des éventuels caractères d'échappement
-        if receipt_data_str.startswith('"') and receipt_data_str.endswith('"'):
-            receipt_data_str = receipt_data_str[1:-1].replace('\\"', '"')
-        
-        # Conversion en dict Python
-        receipt_data = json.loads(receipt_data_str)
-        
-        # Formatage final selon la structure attendue
-        formatted_data = {
-            "date": receipt_data.get("date", ""),
-            "time": receipt_data.get("time", ""),
-            "currency": receipt_data.get("currency", ""),
-            "vendor": receipt_data.get("vendor", ""),
-            "amount": receipt_data.get("amount", ""),
-            "adresse": receipt_data.get("adresse", "")
+    chat_response = client.chat.complete(
+        model=MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    response_data = parse_json_response(chat_response.choices[0].message.content)
+
+    records = response_data.get("receipts", []) if isinstance(response_data, dict) else response_data
+    results = {}
+    for record in records or []:
+        if isinstance(record, dict) and record.get("id") in image_ids:
+            results[record["id"]] = record
+    return dict(zip(image_ids, batch)), results
+
+def extract_receipts_batch(api_key, image_paths, output_dir="project/doc_json",
+                           batch_size=4, max_bytes=MAX_REQUEST_BYTES, server_url=None):
+    """Extrait les données de plusieurs factures en regroupant les images par requête.
+
+    Chaque élément retourné est validé ; les images absentes de la réponse ou
+    invalides sont ré-interrogées individuellement via extract_receipt_data.
+    Un lot refusé pour sa taille est coupé en deux ; un lot en échec pour une
+    autre raison est directement ré-interrogé image par image.
+    Retourne {chemin image: données formatées ou None}.
+    """
+    if batch_size <= 1:
+        return {
+            image_path: extract_receipt_data(api_key, image_path, output_dir, server_url)
+            for image_path in image_paths
         }
-        
-        # Sauvegarde dans un fichier JSON
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_data, f, indent=4, ensure_ascii=False)
-        
-        print(f"Données sauvegardées dans {json_path}")
-        
-    except Exception as e:
-        print(f"Erreur lors de l'extraction des données de la facture : {e}")
-        return None
+
+    if batch_size > MAX_IMAGES_PER_REQUEST:
+        print(f"Attention : batch_size={batch_size} ramené à {MAX_IMAGES_PER_REQUEST} "
+              "images par requête (limite de l'API)")
+
+    client = get_client(api_key, server_url)
+    os.makedirs(output_dir, exist_ok=True)
+
+    context_text = read_context()
+    if not context_text:
+        return {image_path: None for image_path in image_paths}
+
+    results = {}
+    encoded_images = []
+    for image_path in image_paths:
+        base64_image = encode_image(image_path)
+        if base64_image:
+            encoded_images.append((image_path, base64_image))
+        else:
+            results[image_path] = None
+
+    retry = []
+    pending = split_batches(encoded_images, batch_size, max_bytes)
+    while pending:
+        batch = pending.pop(0)
+        if len(batch) == 1:
+            retry.append(batch[0][0])
+            continue
+
+        try:
+            id_to_image, records = request_batch(client, context_text, batch)
+        except Exception as e:
+            if is_size_error(e):
+                # Requête trop lourde : on coupe le lot en deux
+                print(f"Lot de {len(batch)} factures trop volumineux "
+                      f"(HTTP {getattr(e, 'status_code', '?')}), découpage")
+                middle = len(batch) // 2
+                pending[:0] = [batch[:middle], batch[middle:]]
+            else:
+                # Autre erreur (authentification, réseau, réponse illisible) :
+                # les factures du lot sont ré-interrogées individuellement
+                print(f"Erreur sur un lot de {len(batch)} factures : {e}")
+                retry.extend(image_path for image_path, _ in batch)
+            continue
+
+        for image_id, (image_path, _) in id_to_image.items():
+            formatted_data = format_receipt(records.get(image_id, {}))
+            if image_id in records and is_valid_receipt(formatted_data):
+                save_receipt(formatted_data, get_json_path(image_path, output_dir))
+                results[image_path] = formatted_data
+            else:
+                retry.append(image_path)
+
+    # Ré-interrogation individuelle des éléments manquants ou invalides
+    for image_path in retry:
+        results[image_path] = extract_receipt_data(api_key, image_path, output_dir, server_url)
+
+    return {image_path: results.get(image_path) for image_path in image_paths}
@@ -0,0 +1,294 @@
+import hashlib
+import hmac
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Limites par défaut du cache partagé entre les sessions
+DEFAULT_MAX_MEMORY_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+# Le dossier disque n'est parcouru (expiration, limite de taille) qu'au plus
+# toutes les DISK_SCAN_INTERVAL secondes, ou après l'écriture de 10 % de la
+# limite disque depuis le dernier parcours
+DISK_SCAN_INTERVAL = 60
+KEY_FILENAME = "secret.key"
+KEY_SIZE = 32
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "rapprochement_bancaire"
+)
+
+def ensure_private_dir(path):
+    """Crée le dossier en mode 0o700, ou refuse un dossier existant non privé.
+
+    Les fichiers du cache sont désérialisés : un dossier appartenant à un
+    autre utilisateur, ou accessible en écriture par d'autres, permettrait
+    d'y déposer des entrées piégées.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"Le cache {path} n'est pas un dossier")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"Le cache {path} appartient à un autre utilisateur")
+    if info.st_mode & 0o077:
+        raise PermissionError(
+            f"Le cache {path} est accessible à d'autres utilisateurs "
+            f"(mode {stat.S_IMODE(info.st_mode):o}, attendu 700)"
+        )
+
+def load_or_create_key(cache_dir):
+    """Lit la clé de signature du cache, ou la crée une fois (mode 0o600).
+
+    La clé est partagée par les processus qui utilisent le même dossier, ce
+    qui permet au stockage disque de survivre aux redémarrages.
+    """
+    key_path = os.path.join(cache_dir, KEY_FILENAME)
+    if not os.path.exists(key_path):
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(os.urandom(KEY_SIZE))
+            # Lien atomique : si un autre processus a créé la clé entre-temps,
+            # c'est la sienne qui est conservée
+            os.link(temp_path, key_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    info = os.lstat(key_path)
+    if not stat.S_ISREG(info.st_mode):
+        raise PermissionError(f"La clé du cache {key_path} n'est pas un fichier")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"La clé du cache {key_path} appartient à un autre utilisateur")
+    if info.st_mode & 0o077:
+        raise PermissionError(
+            f"La clé du cache {key_path} est accessible à d'autres utilisateurs "
+            f"(mode {stat.S_IMODE(info.st_mode):o}, attendu 600)"
+        )
+    with open(key_path, "rb") as f:
+        key = f.read()
+    if len(key) != KEY_SIZE:
+        raise PermissionError(f"La clé du cache {key_path} est invalide")
+    return key
+
+def content_hash(*parts):
+    """Empreinte SHA-256 d'un ou plusieurs contenus (bytes ou str)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+class SharedCache:
+    """Cache clé/valeur borné en mémoire (LRU) et adossé à un stockage disque.
+
+    Les valeurs sont indexées par (namespace, empreinte du contenu) et
+    expirent après ttl secondes. Une instance est partagée par toutes les
+    sessions d'un même serveur ; les valeurs retournées ne doivent donc pas
+    être modifiées en place.
+
+    Le dossier disque doit être privé (0o700, même propriétaire). Chaque
+    fichier est signé (HMAC-SHA256) avec la clé du dossier (fichier
+    secret.key, mode 0o600) : un fichier dont la signature ne correspond pas
+    est ignoré sans être désérialisé.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, ttl=DEFAULT_TTL_SECONDS, secret_key=None):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        ensure_private_dir(cache_dir)
+        self._secret_key = secret_key or load_or_create_key(cache_dir)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (valeur, taille, date de création)
+        self._memory_bytes = 0
+        self._stats = {}
+        self._last_disk_scan = 0.0
+        self._bytes_since_scan = 0
+
+    def _count(self, namespace, event):
+        counters = self._stats.setdefault(namespace, {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0})
+        counters[event] += 1
+
+    def _signature(self, namespace, key, data):
+        message = f"{namespace}-{key}\n".encode("utf-8") + data
+        return hmac.new(self._secret_key, message, hashlib.sha256).digest()
+
+    def _disk_path(self, namespace, key):
+        return os.path.join(self.cache_dir, f"{namespace}-{key}.pkl")
+
+    def _evict_memory(self):
+        """Retire les entrées les moins récemment utilisées au-delà de la limite mémoire."""
+        while self._memory_bytes > self.max_memory_bytes and self._entries:
+            (namespace, _), (_, size, _) = self._entries.popitem(last=False)
+            self._memory_bytes -= size
+            self._count(namespace, "evictions")
+
+    @staticmethod
+    def _remove(path):
+        # Un autre processus a pu supprimer le fichier entre-temps
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _disk_scan_due(self, written_bytes):
+        """Indique si le dossier disque doit être parcouru après une écriture."""
+        now = time.time()
+        with self._lock:
+            self._bytes_since_scan += written_bytes
+            if (now - self._last_disk_scan < DISK_SCAN_INTERVAL
+                    and self._bytes_since_scan < self.max_disk_bytes // 10):
+                return False
+            self._last_disk_scan = now
+            self._bytes_since_scan = 0
+            return True
+
+    def _evict_disk(self):
+        """Supprime les fichiers expirés puis les plus anciens au-delà de la limite disque."""
+        now = time.time()
+        files = []
+        for filename in os.listdir(self.cache_dir):
+            if filename == KEY_FILENAME:
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - info.st_mtime > self.ttl:
+                self._remove(path)
+            else:
+                files.append((info.st_mtime, info.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _store(self, namespace, key, value, data, created):
+        # Une valeur plus grande que la limite mémoire ne reste que sur disque
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            if (namespace, key) in self._entries:
+                return
+            self._entries[(namespace, key)] = (value, len(data), created)
+            self._memory_bytes += len(data)
+            self._evict_memory()
+
+    def get(self, namespace, key, persist=True):
+        """Retourne (trouvé, valeur) en cherchant en mémoire puis sur disque.
+
+        persist=False limite la recherche à la mémoire.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                value, size, created = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end((namespace, key))
+                    self._count(namespace, "hits")
+                    return True, value
+                del self._entries[(namespace, key)]
+                self._memory_bytes -= size
+
+        if not persist:
+            with self._lock:
+                self._count(namespace, "misses")
+            return False, None
+
+        path = self._disk_path(namespace, key)
+        try:
+            created = os.stat(path).st_mtime
+            if now - created <= self.ttl:
+                with open(path, "rb") as f:
+                    signature, data = f.read(32), f.read()
+                if not hmac.compare_digest(signature, self._signature(namespace, key, data)):
+                    # Fichier altéré ou signé avec une autre clé : jamais désérialisé
+                    raise FileNotFoundError(path)
+                value = pickle.loads(data)
+                self._store(namespace, key, value, data, created)
+                with self._lock:
+                    self._count(namespace, "disk_hits")
+                return True, value
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur de lecture du cache {path} : {e}")
+
+        with self._lock:
+            self._count(namespace, "misses")
+        return False, None
+
+    def set(self, namespace, key, value, persist=True):
+        """Enregistre une valeur en mémoire et, si persist, sur disque.
+
+        persist=False convient aux petites valeurs très nombreuses (un
+        fichier par entrée coûterait plus que leur calcul).
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store(namespace, key, value, data, time.time())
+
+        if not persist or len(data) > self.max_disk_bytes:
+            return
+        path = self._disk_path(namespace, key)
+        try:
+            # Écriture atomique : une lecture concurrente ne voit jamais un fichier partiel
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._signature(namespace, key, data))
+                f.write(data)
+            os.replace(temp_path, path)
+            if self._disk_scan_due(len(data)):
+                self._evict_disk()
+        except Exception as e:
+            print(f"Erreur d'écriture du cache {path} : {e}")
+
+    def get_or_compute(self, namespace, key, compute, persist=True):
+        """Retourne la valeur en cache, ou la calcule et l'enregistre."""
+        found, value = self.get(namespace, key, persist)
+        if found:
+            return value
+        value = compute()
+        self.set(namespace, key, value, persist)
+        return value
+
+    def stats(self):
+        """Statistiques par namespace (succès, échecs, évictions, taux de succès)."""
+        with self._lock:
+            stats = {}
+            for namespace, counters in self._stats.items():
+                lookups = counters["hits"] + counters["disk_hits"] + counters["misses"]
+                hit_rate = (counters["hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+                stats[namespace] = {**counters, "hit_rate": hit_rate}
+            stats["_memory"] = {
+                "entries": len(self._entries),
+                "bytes": self._memory_bytes,
+                "max_bytes": self.max_memory_bytes
+            }
+            return stats
+
+    def clear(self):
+        """Vide le cache mémoire et disque (la clé de signature est conservée)."""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        for filename in os.listdir(self.cache_dir):
+            if filename != KEY_FILENAME:
+                self._remove(os.path.join(self.cache_dir, filename))